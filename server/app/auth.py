@@ -1,8 +1,13 @@
 # server/app/auth.py
+import hashlib
 import os
+import secrets
+import threading
+import time
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 
+from cachetools import TLRUCache, TTLCache
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
@@ -16,13 +21,38 @@ SECRET_KEY = os.getenv("SECRET_KEY", "dev-secret-change-me")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "10080"))  # default 7 days
 
+# --- Per-process auth caches ---
+# Clients reuse the same bearer token for many requests, so remember verified
+# payloads (keyed by the token's SHA-256) and recently loaded users for a short
+# while instead of re-checking the signature and re-querying on every call.
+TOKEN_CACHE_TTL = 60  # seconds; entries also never outlive the token's own exp
+USER_CACHE_TTL = 30  # seconds
+
+def _token_ttu(_key, value, now):
+    # value is (payload, exp as unix time); `now` is the cache's monotonic clock
+    return now + min(TOKEN_CACHE_TTL, value[1] - time.time())
+
+_token_cache = TLRUCache(maxsize=10000, ttu=_token_ttu)
+_user_cache = TTLCache(maxsize=10000, ttl=USER_CACHE_TTL)
+_cache_lock = threading.Lock()
+
 # --- Password hashing ---
-# Use a pure-Python scheme to avoid native bcrypt backend issues on macOS/Py3.13
+# Argon2id (argon2-cffi) with the OWASP 19 MiB / t=2 / p=1 profile. pbkdf2_sha256
+# stays listed only so existing hashes still verify; it is deprecated, so those
+# get rehashed to Argon2 on the user's next successful login.
 pwd_context = CryptContext(
-    schemes=["pbkdf2_sha256"],
+    schemes=["argon2", "pbkdf2_sha256"],
     deprecated="auto",
+    argon2__type="ID",
+    argon2__memory_cost=19456,
+    argon2__time_cost=2,
+    argon2__parallelism=1,
 )
 
+# Checked against when the email is unknown, so a miss does the same hash work
+# as a wrong password and response time doesn't reveal which emails exist.
+_DUMMY_HASH = pwd_context.hash(secrets.token_urlsafe(32))
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
 # --- DB dependency ---
@@ -36,9 +66,15 @@ def get_db():
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
-def verify_password(plain_password: str, password_hash: str) -> bool:
+def verify_password(plain_password: str, password_hash: Optional[str]) -> bool:
+    if password_hash is None:
+        pwd_context.verify(plain_password, _DUMMY_HASH)
+        return False
     return pwd_context.verify(plain_password, password_hash)
 
+def password_needs_rehash(password_hash: str) -> bool:
+    return pwd_context.needs_update(password_hash)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
@@ -54,16 +90,37 @@ def get_current_user(
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    key = hashlib.sha256(token.encode()).digest()
+    with _cache_lock:
+        cached = _token_cache.get(key)
+    if cached is not None:
+        payload = cached[0]
+    else:
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except JWTError:
+            raise cred_exc
+        exp = payload.get("exp")
+        if exp is not None:
+            with _cache_lock:
+                _token_cache[key] = (payload, float(exp))
+
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         uid = payload.get("sub")
         if uid is None:
             raise cred_exc
         user_id = int(uid)
-    except (JWTError, ValueError):
+    except ValueError:
         raise cred_exc
 
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        raise cred_exc
+    with _cache_lock:
+        user = _user_cache.get(user_id)
+    if user is None:
+        user = db.query(User).filter(User.id == user_id).first()
+        if not user:
+            raise cred_exc
+        # Detach so a later commit in this session can't expire the cached copy
+        db.expunge(user)
+        with _cache_lock:
+            _user_cache[user_id] = user
     return user
@@ -2,7 +2,7 @@
 import os
 from dotenv import load_dotenv
 from sqlalchemy import (
-    create_engine, Column, Integer, String, Date, Float, ForeignKey, UniqueConstraint
+    create_engine, Column, Integer, String, Date, Float, ForeignKey, Index, UniqueConstraint
 )
 from sqlalchemy.orm import declarative_base, sessionmaker
 
@@ -12,12 +12,20 @@ load_dotenv()
 # Use psycopg3 driver (you installed psycopg, not psycopg2)
 DATABASE_URL = os.getenv("DATABASE_URL", "postgresql+psycopg://localhost:5432/taxdash")
 
+# Pool sized for the threadpool FastAPI runs sync endpoints on; recycle before
+# server-side idle timeouts drop connections, and fail fast when exhausted.
 engine = create_engine(
     DATABASE_URL,
     pool_pre_ping=True,
+    pool_size=int(os.getenv("DB_POOL_SIZE", "20")),
+    max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "40")),
+    pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "1800")),
+    pool_timeout=int(os.getenv("DB_POOL_TIMEOUT", "5")),
     future=True,
 )
-SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+SessionLocal = sessionmaker(
+    bind=engine, autoflush=False, autocommit=False, expire_on_commit=False, future=True
+)
 Base = declarative_base()
 
 # --- Models ---------------------------------------------------------------
@@ -54,3 +62,9 @@ class LotDB(Base):
     cost_per_share = Column(Float, nullable=False)
     purchase_date = Column(Date, nullable=False)
     account = Column(String, nullable=True)
+
+    # Leftmost prefixes of this index also serve the per-user (user_id) and
+    # per-symbol (user_id, symbol) scans, so no separate indexes are declared.
+    __table_args__ = (
+        Index("ix_lots_user_symbol_date", "user_id", "symbol", "purchase_date"),
+    )
@@ -1,36 +1,45 @@
 # server/app/main.py
-import io, csv, os, json, httpx
+import codecs, csv, os, sys, json, httpx, threading
 from datetime import date
+from itertools import islice
 from typing import List, Dict
+import numpy as np
+import orjson
+from cachetools import TTLCache
 from dotenv import load_dotenv
 from openai import OpenAI
 
 
 from fastapi import FastAPI, UploadFile, HTTPException, Query, Depends, Request
 from fastapi.security import OAuth2PasswordRequestForm
-from fastapi.responses import JSONResponse
-from fastapi.encoders import jsonable_encoder
+from fastapi.responses import ORJSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 
-from sqlalchemy import text
+from sqlalchemy import func, insert, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
 
 from app.models import TaxProfileIn, QuoteUpsert, TaxProfileEstimateIn, TaxProfileEstimateOut
-from app.tax_engine import TaxProfile, Lot, estimate_lot, summarize, days_to_lt
+from app.tax_engine import TaxProfile, LotBatch, estimate_batch, summarize_batch, days_to_lt
 from app.db import User, TaxProfileDB, LotDB
-from app.quotes import get_quotes
+from app.quotes import QUOTES_CACHE_TTL, get_quotes
 
 # Import auth helpers; alias to the names this file expects
 from app.auth import (
     get_db,
     get_password_hash,
     verify_password,
+    password_needs_rehash,
     create_access_token,
     get_current_user,
 )
 
-app = FastAPI(title="Tax-Aware Portfolio API", version="0.2.0")
+app = FastAPI(
+    title="Tax-Aware Portfolio API",
+    version="0.2.0",
+    default_response_class=ORJSONResponse,
+)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
@@ -54,24 +63,74 @@ client = OpenAI(api_key=OPENAI_API_KEY) if OPENAI_API_KEY else None
 # -----------------------
 # Helpers
 # -----------------------
+# Nullable columns are coalesced in SQL so rows map straight onto TaxProfile
+_PROFILE_COLUMNS = (
+    TaxProfileDB.filing_status,
+    TaxProfileDB.federal_st_rate,
+    TaxProfileDB.federal_lt_rate,
+    TaxProfileDB.state_code,
+    TaxProfileDB.state_st_rate,
+    TaxProfileDB.state_lt_rate,
+    func.coalesce(TaxProfileDB.niit_rate, 0.0).label("niit_rate"),
+    func.coalesce(TaxProfileDB.carry_forward_losses, 0.0).label("carry_forward_losses"),
+)
+
+def _profile_row(db: Session, user_id: int):
+    return db.execute(
+        select(*_PROFILE_COLUMNS).where(TaxProfileDB.user_id == user_id)
+    ).first()
+
+# Profiles change rarely but are read by every data endpoint; PUT /api/tax_profile
+# evicts the caller's entry, other workers catch up within the TTL.
+_profile_cache: TTLCache = TTLCache(maxsize=4096, ttl=60)
+_profile_cache_lock = threading.Lock()
+
 def _load_profile(db: Session, user_id: int) -> TaxProfile:
-    tp: TaxProfileDB | None = (
-        db.query(TaxProfileDB).filter(TaxProfileDB.user_id == user_id).first()
-    )
-    if not tp:
+    with _profile_cache_lock:
+        cached = _profile_cache.get(user_id)
+    if cached is not None:
+        return cached
+    row = _profile_row(db, user_id)
+    if not row:
         raise HTTPException(
             status_code=404, detail="No tax profile set"
         )
-    return TaxProfile(
-        filing_status=tp.filing_status,
-        federal_st_rate=float(tp.federal_st_rate),
-        federal_lt_rate=float(tp.federal_lt_rate),
-        state_code=tp.state_code,
-        state_st_rate=float(tp.state_st_rate),
-        state_lt_rate=float(tp.state_lt_rate),
-        niit_rate=float(tp.niit_rate or 0.0),
-        carry_forward_losses=float(tp.carry_forward_losses or 0.0),
+    profile = TaxProfile(**row._mapping)
+    with _profile_cache_lock:
+        _profile_cache[user_id] = profile
+    return profile
+
+# Columns the read endpoints use; selecting them directly yields light Row tuples
+# instead of tracked ORM instances.
+_LOT_COLUMNS = (
+    LotDB.id,
+    LotDB.symbol,
+    LotDB.quantity,
+    LotDB.cost_per_share,
+    LotDB.purchase_date,
+    LotDB.account,
+)
+
+def _user_lots(db: Session, user_id: int):
+    return db.execute(select(*_LOT_COLUMNS).where(LotDB.user_id == user_id)).all()
+
+def _user_symbols(db: Session, user_id: int) -> List[str]:
+    # Sorted distinct symbols straight off the (user_id, symbol, ...) index
+    stmt = select(LotDB.symbol).where(LotDB.user_id == user_id).distinct().order_by(LotDB.symbol)
+    return list(db.execute(stmt).scalars())
+
+def _estimate_rows(rows, prices: Dict[str, float], profile: TaxProfile) -> tuple[list, LotBatch]:
+    """Vectorized estimate for the lot rows that have a quote; returns (priced rows, batch)."""
+    priced = [r for r in rows if prices.get(r.symbol) is not None]
+    n = len(priced)
+    batch = estimate_batch(
+        np.fromiter((r.quantity for r in priced), dtype=np.float64, count=n),
+        np.fromiter((r.cost_per_share for r in priced), dtype=np.float64, count=n),
+        np.fromiter((prices[r.symbol] for r in priced), dtype=np.float64, count=n),
+        np.fromiter((r.purchase_date.toordinal() for r in priced), dtype=np.int64, count=n),
+        profile,
     )
+    return priced, batch
 
 class AgentChatIn(BaseModel):
     message: str
@@ -181,13 +240,18 @@ class TokenOut(BaseModel):
 @app.post("/api/auth/signup", response_model=TokenOut)
 def signup(payload: SignupIn, db: Session = Depends(get_db)):
     email = payload.email.strip().lower()
-    if db.query(User).filter(User.email == email).first():
+    # Single round-trip and race-free: the unique email index decides, not a pre-SELECT
+    stmt = (
+        pg_insert(User)
+        .values(email=email, password_hash=get_password_hash(payload.password))
+        .on_conflict_do_nothing(index_elements=[User.email])
+        .returning(User.id)
+    )
+    uid = db.execute(stmt).scalar()
+    if uid is None:
         raise HTTPException(400, "Email already registered")
-    user = User(email=email, password_hash=get_password_hash(payload.password))
-    db.add(user)
     db.commit()
-    db.refresh(user)
-    token = create_access_token({"sub": str(user.id)})
+    token = create_access_token({"sub": str(uid)})
     return TokenOut(access_token=token)
 
 @app.post("/api/auth/login", response_model=TokenOut)
@@ -195,8 +259,14 @@ def login(form: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get
     # OAuth2PasswordRequestForm passes fields: username, password
     email = form.username.strip().lower()
     user = db.query(User).filter(User.email == email).first()
-    if not user or not verify_password(form.password, user.password_hash):
+    # Always run the hash check so unknown emails fail in the same time as bad passwords
+    ok = verify_password(form.password, user.password_hash if user else None)
+    if not user or not ok:
         raise HTTPException(status_code=400, detail="Incorrect email or password")
+    if password_needs_rehash(user.password_hash):
+        # Upgrade legacy pbkdf2 hashes to the current scheme while we have the plaintext
+        user.password_hash = get_password_hash(form.password)
+        db.commit()
     token = create_access_token({"sub": str(user.id)})
     return TokenOut(access_token=token)
 
@@ -230,18 +300,33 @@ def debug_db(db: Session = Depends(get_db)):
 # -----------------------
 MEM_QUOTES: Dict[str, float] = {}
 
+# Rendered GET /api/quotes bodies keyed by (version, symbols). Upserts bump the
+# version so stub entries go stale immediately; the TTL bounds live-source staleness.
+_quotes_version = 0
+_quotes_body_cache: TTLCache = TTLCache(maxsize=1024, ttl=QUOTES_CACHE_TTL)
+_quotes_body_lock = threading.Lock()
+
 @app.put("/api/quotes")
 def upsert_quotes(body: QuoteUpsert):
     """Public for convenience; can protect later."""
-    global MEM_QUOTES
-    MEM_QUOTES.update(body.root)
+    global MEM_QUOTES, _quotes_version
+    # Lots are stored upper-cased; intern keys so lookups mostly hit the identity fast path
+    MEM_QUOTES.update({sys.intern(k.strip().upper()): float(v) for k, v in body.root.items()})
+    with _quotes_body_lock:
+        _quotes_version += 1
     return {"symbols": sorted(MEM_QUOTES.keys())}
 
 @app.get("/api/quotes")
 def api_quotes(symbols: str = Query(..., description="Comma-separated symbols")):
-    syms = [s.strip().upper() for s in symbols.split(",") if s.strip()]
-    out = get_quotes(syms, MEM_QUOTES)
-    return JSONResponse(content=jsonable_encoder(out))
+    syms = tuple(s.strip().upper() for s in symbols.split(",") if s.strip())
+    with _quotes_body_lock:
+        key = (_quotes_version, syms)
+        body = _quotes_body_cache.get(key)
+    if body is None:
+        body = orjson.dumps(get_quotes(list(syms), MEM_QUOTES))
+        with _quotes_body_lock:
+            _quotes_body_cache[key] = body
+    return Response(content=body, media_type="application/json")
 
 # -----------------------
 # Tax profile (protected)
@@ -260,6 +345,8 @@ def put_tax_profile(
         for k, v in p.model_dump().items():
             setattr(tp, k, v)
     db.commit()
+    with _profile_cache_lock:
+        _profile_cache.pop(current_user.id, None)
     return {"ok": True}
 
 @app.get("/api/tax_profile")
@@ -267,44 +354,43 @@ def get_tax_profile(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    tp = db.query(TaxProfileDB).filter(TaxProfileDB.user_id == current_user.id).first()
-    if not tp:
+    row = _profile_row(db, current_user.id)
+    if not row:
         raise HTTPException(status_code=404, detail="No tax profile set")
-    return {
-        "filing_status": tp.filing_status,
-        "federal_st_rate": float(tp.federal_st_rate),
-        "federal_lt_rate": float(tp.federal_lt_rate),
-        "state_code": tp.state_code,
-        "state_st_rate": float(tp.state_st_rate),
-        "state_lt_rate": float(tp.state_lt_rate),
-        "niit_rate": float(tp.niit_rate or 0.0),
-        "carry_forward_losses": float(tp.carry_forward_losses or 0.0),
-    }
+    return dict(row._mapping)
 
 # -----------------------
 # Import holdings CSV (protected, per-user)
 # -----------------------
+IMPORT_BATCH_ROWS = 5000
+
 @app.post("/api/import/csv")
-async def import_csv(
+def import_csv(
     file: UploadFile,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    data = await file.read()
-    reader = csv.DictReader(io.StringIO(data.decode()))
+    # Parse the spooled upload row by row and insert in fixed-size batches, so
+    # memory stays bounded by one batch rather than the whole file.
+    # iterdecode works on any file-like upload (TextIOWrapper needs readable(), 3.11+ only).
+    reader = csv.DictReader(codecs.iterdecode(file.file, "utf-8"))
+    uid = current_user.id
+    rows = (
+        {
+            "user_id": uid,
+            "symbol": r["symbol"].upper(),
+            "quantity": float(r["quantity"]),
+            "cost_per_share": float(r["cost_per_share"]),
+            "purchase_date": date.fromisoformat(r["purchase_date"]),
+            "account": (r.get("account") or None),
+        }
+        for r in reader
+    )
     n = 0
-    for r in reader:
-        db.add(
-            LotDB(
-                user_id=current_user.id,
-                symbol=r["symbol"].upper(),
-                quantity=float(r["quantity"]),
-                cost_per_share=float(r["cost_per_share"]),
-                purchase_date=date.fromisoformat(r["purchase_date"]),
-                account=(r.get("account") or None),
-            )
-        )
-        n += 1
+    # One executemany (batched multi-VALUES INSERT) per batch instead of a unit-of-work entry per row
+    while batch := list(islice(rows, IMPORT_BATCH_ROWS)):
+        db.execute(insert(LotDB), batch)
+        n += len(batch)
     db.commit()
     return {"lots": n}
 
@@ -317,24 +403,16 @@ def api_holdings(
     current_user: User = Depends(get_current_user),
 ):
     profile = _load_profile(db, user_id=current_user.id)
-    rows = db.query(LotDB).filter(LotDB.user_id == current_user.id).all()
-    symbols = sorted({r.symbol for r in rows})
+    rows = _user_lots(db, current_user.id)
+    symbols = _user_symbols(db, current_user.id)
     prices = get_quotes(symbols, MEM_QUOTES)
 
-    out: List[dict] = []
-    for r in rows:
-        price = prices.get(r.symbol)
-        if price is None:
-            continue
-        lot = Lot(
-            symbol=r.symbol,
-            quantity=float(r.quantity),
-            cost_per_share=float(r.cost_per_share),
-            purchase_date=r.purchase_date,
-            account=r.account,
-        )
-        out.append(estimate_lot(lot, price, profile).__dict__)
-    return JSONResponse(content=jsonable_encoder(out))
+    priced, batch = _estimate_rows(rows, prices, profile)
+    out: List[dict] = batch.to_dicts(
+        [r.symbol for r in priced], [r.purchase_date for r in priced]
+    )
+    # orjson handles dates/floats natively; returning the response skips jsonable_encoder
+    return ORJSONResponse(out)
 
 @app.get("/api/portfolio/summary")
 def api_summary(
@@ -342,25 +420,13 @@ def api_summary(
     current_user: User = Depends(get_current_user),
 ):
     profile = _load_profile(db, user_id=current_user.id)
-    rows = db.query(LotDB).filter(LotDB.user_id == current_user.id).all()
-    symbols = sorted({r.symbol for r in rows})
+    rows = _user_lots(db, current_user.id)
+    symbols = _user_symbols(db, current_user.id)
     prices = get_quotes(symbols, MEM_QUOTES)
 
-    est = []
-    for r in rows:
-        price = prices.get(r.symbol)
-        if price is None:
-            continue
-        lot = Lot(
-            symbol=r.symbol,
-            quantity=float(r.quantity),
-            cost_per_share=float(r.cost_per_share),
-            purchase_date=r.purchase_date,
-            account=r.account,
-        )
-        est.append(estimate_lot(lot, price, profile))
-    s = summarize(est)
-    return JSONResponse(content=jsonable_encoder(s.__dict__))
+    _, batch = _estimate_rows(rows, prices, profile)
+    s = summarize_batch(batch)
+    return ORJSONResponse(s)
 
 # -----------------------
 # What-if & Harvest (protected)
@@ -373,10 +439,28 @@ class WhatIfOut(BaseModel):
     est_tax: float
     lots_consumed: list[dict]  # [{lot_id, qty_used, term, realized_gain, est_tax}]
 
-def _pick_fifo_lots(lots, symbol, qty):
-    """Yield (lot, qty_used) for the given symbol until qty is satisfied."""
+def _fifo_lots(db: Session, user_id: int, symbol: str, qty: float):
+    """
+    Lots for (user, symbol) in FIFO order, stopping at the first lot that covers qty.
+    The running total is computed in SQL so lots past that point are never fetched.
+    """
+    cum = func.sum(LotDB.quantity).over(order_by=(LotDB.purchase_date, LotDB.id)).label("cum")
+    fifo = (
+        select(LotDB.id, LotDB.quantity, LotDB.cost_per_share, LotDB.purchase_date, cum)
+        .where(LotDB.user_id == user_id, LotDB.symbol == symbol)
+        .subquery()
+    )
+    stmt = (
+        select(fifo)
+        .where(fifo.c.cum - fifo.c.quantity < qty)
+        .order_by(fifo.c.purchase_date, fifo.c.id)
+    )
+    return db.execute(stmt).all()
+
+def _pick_fifo_lots(lots, qty):
+    """Yield (lot, qty_used) from lots already in FIFO order until qty is satisfied."""
     remaining = qty
-    for l in sorted((x for x in lots if x.symbol == symbol), key=lambda x: x.purchase_date):
+    for l in lots:
         if remaining <= 0:
             break
         use = min(remaining, l.quantity)
@@ -392,7 +476,7 @@ def whatif_sell(
 ):
     profile = _load_profile(db, user_id=current_user.id)
     symbol = symbol.upper()
-    lots = db.query(LotDB).filter(LotDB.user_id == current_user.id, LotDB.symbol == symbol).all()
+    lots = _fifo_lots(db, current_user.id, symbol, quantity)
     if not lots:
         raise HTTPException(404, f"No lots for {symbol}")
 
@@ -405,19 +489,15 @@ def whatif_sell(
     est_tax = 0.0
     details = []
     consumed = 0.0
-    for lot, use in _pick_fifo_lots(lots, symbol, quantity):
+    today_ord = date.today().toordinal()
+    lt_rate, st_rate = profile.total_lt_rate, profile.total_st_rate
+    for lot, use in _pick_fifo_lots(lots, quantity):
         if use <= 0:
             break
         basis = lot.cost_per_share
         gain = (price - basis) * use
-        term = "lt" if (date.today() - lot.purchase_date).days > 365 else "st"
-        if gain > 0:
-            if term == "lt":
-                tax = gain * (profile.federal_lt_rate + profile.state_lt_rate + profile.niit_rate)
-            else:
-                tax = gain * (profile.federal_st_rate + profile.state_st_rate + profile.niit_rate)
-        else:
-            tax = 0.0
+        term = "lt" if today_ord - lot.purchase_date.toordinal() > 365 else "st"
+        tax = gain * (lt_rate if term == "lt" else st_rate) if gain > 0 else 0.0
 
         realized_gain += gain
         est_tax += tax
@@ -463,10 +543,11 @@ def harvest_candidates(
     current_user: User = Depends(get_current_user),
 ):
     _ = _load_profile(db, user_id=current_user.id)  # Ensures profile exists
-    lots = db.query(LotDB).filter(LotDB.user_id == current_user.id).all()
-    symbols = list({l.symbol for l in lots})
+    lots = _user_lots(db, current_user.id)
+    symbols = _user_symbols(db, current_user.id)
     prices = get_quotes(symbols, MEM_QUOTES)
 
+    today = date.today()
     rows: list[HarvestCandidate] = []
     for l in lots:
         price = prices.get(l.symbol)
@@ -475,14 +556,14 @@ def harvest_candidates(
         loss = (price - l.cost_per_share) * l.quantity
         if loss >= 0:
             continue
-        d2lt = days_to_lt(l.purchase_date)
+        d2lt = days_to_lt(l.purchase_date, asof=today)
         rows.append(HarvestCandidate(
             symbol=l.symbol,
             lot_id=l.id if hasattr(l, "id") else None,
             purchase_date=l.purchase_date.isoformat(),
-            quantity=float(l.quantity),
-            cost_per_share=float(l.cost_per_share),
-            price=float(price),
+            quantity=l.quantity,
+            cost_per_share=l.cost_per_share,
+            price=price,
             unrealized_loss=round(-loss, 2),  # positive number
             days_to_lt=d2lt,
         ))
@@ -1,11 +1,20 @@
 import os
+import threading
 from typing import Dict, List
 
+from cachetools import TTLCache
+
 # QUOTES_SOURCE controls where prices come from:
 #   "stub"     -> use the in-memory map set via PUT /api/quotes
 #   "yfinance" -> fetch last available price from Yahoo
 SOURCE = os.getenv("QUOTES_SOURCE", "stub").lower()
 
+# Yahoo round-trips take hundreds of ms and dashboards re-request the same
+# symbol set within seconds, so remember each set's prices briefly.
+QUOTES_CACHE_TTL = int(os.getenv("QUOTES_CACHE_TTL", "30"))
+_yf_cache: TTLCache = TTLCache(maxsize=1024, ttl=QUOTES_CACHE_TTL)
+_yf_cache_lock = threading.Lock()
+
 def get_quotes_stub(symbols: List[str], mem_quotes: Dict[str, float]) -> Dict[str, float]:
     return {s: mem_quotes.get(s) for s in symbols}
 
@@ -21,29 +30,34 @@ def get_quotes_yfinance(symbols: List[str]) -> Dict[str, float]:
     tickers = " ".join(symbols)
     df = yf.download(tickers=tickers, period="1d", interval="1m", group_by="ticker", progress=False)
 
-    out: Dict[str, float] = {}
-
-    # multi-ticker -> columns by ticker; single-ticker -> plain columns
-    if "Close" in df:  # single ticker structure
-        last = float(df["Close"].dropna().iloc[-1])
-        out[symbols[0]] = last
-        return out
-
-    # multi-ticker structure: df[ticker]["Close"]
-    for s in symbols:
-        try:
-            ser = df[(s, "Close")].dropna()
-            if not ser.empty:
-                out[s] = float(ser.iloc[-1])
-        except Exception:
-            # if symbol not found, skip it; caller can handle None
-            pass
+    if df.empty:
+        return {}
+
+    # group_by="ticker" gives (ticker, field) columns; older single-ticker downloads
+    # come back with plain field columns
+    if isinstance(df.columns, pd.MultiIndex):
+        closes = df.xs("Close", level=1, axis=1)
+    else:
+        closes = df[["Close"]].set_axis([symbols[0]], axis=1)
+
+    # One forward-fill over all tickers instead of a dropna() copy per symbol
+    last = closes.ffill().iloc[-1]
+    return {s: float(last[s]) for s in symbols if s in last.index and not pd.isna(last[s])}
+
+def get_quotes_yfinance_cached(symbols: List[str]) -> Dict[str, float]:
+    key = tuple(sorted(symbols))
+    with _yf_cache_lock:
+        out = _yf_cache.get(key)
+    if out is None:
+        out = get_quotes_yfinance(list(key))
+        with _yf_cache_lock:
+            _yf_cache[key] = out
     return out
 
 def get_quotes(symbols: List[str], mem_quotes: Dict[str, float]) -> Dict[str, float]:
     if SOURCE == "stub":
         return get_quotes_stub(symbols, mem_quotes)
     elif SOURCE == "yfinance":
-        return get_quotes_yfinance(symbols)
+        return get_quotes_yfinance_cached(symbols)
     else:
         raise ValueError(f"Unknown QUOTES_SOURCE: {SOURCE}")
@@ -1,11 +1,18 @@
-from dataclasses import dataclass
-from datetime import date, timedelta
-from typing import List, Optional
+import os
+from dataclasses import dataclass, field
+from datetime import date
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+# Below this many lots the NumPy path is already fast and thread start-up dominates;
+# batch jobs can lower it (NUMBA_MIN_LOTS=0 always uses the kernel)
+NUMBA_MIN_LOTS = int(os.getenv("NUMBA_MIN_LOTS", "20000"))
 
 # -----------------------------
 # Data models
 # -----------------------------
-@dataclass
+@dataclass(frozen=True, slots=True)
 class TaxProfile:
     filing_status: str
     federal_st_rate: float
@@ -15,14 +22,21 @@ class TaxProfile:
     state_lt_rate: float
     niit_rate: float = 0.0
     carry_forward_losses: float = 0.0
+    # Combined rates, summed once here rather than on every lot estimate
+    _total_st: float = field(init=False, repr=False, compare=False)
+    _total_lt: float = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, "_total_st", self.federal_st_rate + self.state_st_rate + self.niit_rate)
+        object.__setattr__(self, "_total_lt", self.federal_lt_rate + self.state_lt_rate + self.niit_rate)
 
     @property
     def total_st_rate(self) -> float:
-        return self.federal_st_rate + self.state_st_rate + self.niit_rate
+        return self._total_st
 
     @property
     def total_lt_rate(self) -> float:
-        return self.federal_lt_rate + self.state_lt_rate + self.niit_rate
+        return self._total_lt
 
 
 @dataclass
@@ -58,7 +72,7 @@ def is_long_term(purchase_date: date, today: Optional[date] = None) -> bool:
     Long-term threshold is holding period > 365 days (>= 366 days).
     """
     today = today or date.today()
-    return (today - purchase_date).days >= 366
+    return today.toordinal() - purchase_date.toordinal() >= 366
 
 
 LT_DAYS = 365
@@ -70,8 +84,7 @@ def days_to_lt(purchase_date: date, asof: Optional[date] = None) -> int:
     If already long-term, returns 0.
     """
     asof = asof or date.today()
-    delta = (purchase_date + timedelta(days=LT_DAYS)) - asof
-    return max(0, delta.days)
+    return max(0, purchase_date.toordinal() + LT_DAYS - asof.toordinal())
 
 
 # -----------------------------
@@ -80,8 +93,9 @@ def days_to_lt(purchase_date: date, asof: Optional[date] = None) -> int:
 def estimate_lot(lot: Lot, price: float, profile: TaxProfile, today: Optional[date] = None) -> LotResult:
     today = today or date.today()
 
-    holding_days = (today - lot.purchase_date).days
-    long_term = is_long_term(lot.purchase_date, today)
+    # Integer day arithmetic; avoids building timedelta objects per lot
+    holding_days = today.toordinal() - lot.purchase_date.toordinal()
+    long_term = holding_days >= 366
     term_str = "long" if long_term else "short"
 
     gain = (price - lot.cost_per_share) * lot.quantity
@@ -91,7 +105,7 @@ def estimate_lot(lot: Lot, price: float, profile: TaxProfile, today: Optional[da
     est_savings = (-gain) * rate if gain < 0 else 0.0
     after_tax_value = price * lot.quantity - est_tax
 
-    d2lt = 0 if long_term else days_to_lt(lot.purchase_date, asof=today)
+    d2lt = 0 if long_term else max(0, LT_DAYS - holding_days)
 
     return LotResult(
         symbol=lot.symbol,
@@ -109,6 +123,119 @@ def estimate_lot(lot: Lot, price: float, profile: TaxProfile, today: Optional[da
     )
 
 
+# -----------------------------
+# Batch (vectorized) computation
+# -----------------------------
+@dataclass
+class LotBatch:
+    """
+    Column-wise counterpart of a list of LotResult: one array entry per lot.
+    """
+    quantity: np.ndarray
+    price: np.ndarray
+    cost_per_share: np.ndarray
+    holding_days: np.ndarray
+    long_term: np.ndarray
+    unrealized_gain: np.ndarray
+    est_tax_liability: np.ndarray
+    after_tax_value: np.ndarray
+    est_tax_savings: np.ndarray
+    days_to_lt: np.ndarray
+
+    def to_dicts(self, symbols: Sequence[str], purchase_dates: Sequence[date]) -> List[dict]:
+        """
+        Same shape as [estimate_lot(...).__dict__, ...] for the lots in this batch.
+        """
+        terms = np.where(self.long_term, "long", "short").tolist()
+        return [
+            {
+                "symbol": sym,
+                "quantity": q,
+                "price": p,
+                "cost_per_share": c,
+                "purchase_date": pdate,
+                "holding_days": hd,
+                "term": t,
+                "unrealized_gain": g,
+                "est_tax_liability": tax,
+                "after_tax_value": atv,
+                "est_tax_savings": sav,
+                "days_to_lt": d2lt,
+            }
+            for sym, q, p, c, pdate, hd, t, g, tax, atv, sav, d2lt in zip(
+                symbols,
+                self.quantity.tolist(),
+                self.price.tolist(),
+                self.cost_per_share.tolist(),
+                purchase_dates,
+                self.holding_days.tolist(),
+                terms,
+                self.unrealized_gain.tolist(),
+                self.est_tax_liability.tolist(),
+                self.after_tax_value.tolist(),
+                self.est_tax_savings.tolist(),
+                self.days_to_lt.tolist(),
+            )
+        ]
+
+
+def estimate_batch(
+    quantity, cost_per_share, price, purchase_ord, profile: TaxProfile, today: Optional[date] = None,
+    use_numba: Optional[bool] = None,
+) -> LotBatch:
+    """
+    Vectorized estimate_lot over parallel arrays (purchase_ord holds date.toordinal() values).
+    use_numba=None picks the Numba kernel from NUMBA_MIN_LOTS; True/False force it on/off
+    (True still falls back to NumPy when numba is not installed).
+    """
+    today = today or date.today()
+    qty = np.asarray(quantity, dtype=np.float64)
+    cost = np.asarray(cost_per_share, dtype=np.float64)
+    price = np.asarray(price, dtype=np.float64)
+
+    purchase_ord = np.asarray(purchase_ord, dtype=np.int64)
+
+    if use_numba is None:
+        use_numba = qty.shape[0] >= NUMBA_MIN_LOTS
+    kernel = None
+    if use_numba:
+        # Imported on first use: loading numba costs ~150 ms, which small batches never repay
+        from app.tax_engine_fast import batch_estimate as kernel
+    if kernel is not None:
+        # Very large portfolios: one fused, multi-threaded pass without temporaries
+        holding_days, long_term, gain, est_tax, est_savings, after_tax_value, d2lt = (
+            kernel(
+                qty, cost, price, purchase_ord, today.toordinal(),
+                profile.total_lt_rate, profile.total_st_rate,
+            )
+        )
+    else:
+        holding_days = today.toordinal() - purchase_ord
+        long_term = holding_days >= 366
+
+        gain = (price - cost) * qty
+        rate = np.where(long_term, profile.total_lt_rate, profile.total_st_rate)
+
+        est_tax = np.where(gain > 0, gain * rate, 0.0)
+        est_savings = np.where(gain < 0, -gain * rate, 0.0)
+        after_tax_value = price * qty - est_tax
+
+        d2lt = np.where(long_term, 0, np.maximum(0, LT_DAYS - holding_days))
+
+    return LotBatch(
+        quantity=qty,
+        price=price,
+        cost_per_share=cost,
+        holding_days=holding_days,
+        long_term=long_term,
+        unrealized_gain=gain,
+        est_tax_liability=est_tax,
+        after_tax_value=after_tax_value,
+        est_tax_savings=est_savings,
+        days_to_lt=d2lt,
+    )
+
+
 # -----------------------------
 # Portfolio summary
 # -----------------------------
@@ -136,3 +263,19 @@ def summarize(results: List[LotResult]) -> PortfolioSummary:
         naive_net_tax_if_liquidated_now=net_tax,
         after_tax_value_if_liquidated_now=pre - net_tax,
     )
+
+
+def summarize_batch(batch: LotBatch) -> PortfolioSummary:
+    pre = float(np.dot(batch.price, batch.quantity))
+    ug = float(batch.unrealized_gain.sum())
+    tax_gross = float(batch.est_tax_liability.sum())
+    sav_gross = float(batch.est_tax_savings.sum())
+    net_tax = max(tax_gross - sav_gross, 0.0)
+    return PortfolioSummary(
+        pre_tax_value=pre,
+        total_unrealized_gain=ug,
+        gross_tax_on_gains=tax_gross,
+        gross_potential_savings_on_losses=sav_gross,
+        naive_net_tax_if_liquidated_now=net_tax,
+        after_tax_value_if_liquidated_now=pre - net_tax,
+    )
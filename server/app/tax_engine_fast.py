@@ -0,0 +1,59 @@
+import threading
+
+import numpy as np
+
+# numba is optional: without it batch_estimate is None and callers stay on NumPy
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+    prange = range
+
+
+def _batch_estimate(qty, cost, price, purchase_ord, today_ord, lt_rate, st_rate):
+    """
+    One fused pass over the lot arrays; same math as tax_engine.estimate_lot.
+    Returns (holding_days, long_term, gain, est_tax, est_savings, after_tax_value, days_to_lt).
+    """
+    n = qty.shape[0]
+    holding_days = np.empty(n, dtype=np.int64)
+    long_term = np.empty(n, dtype=np.bool_)
+    gain = np.empty(n, dtype=np.float64)
+    est_tax = np.empty(n, dtype=np.float64)
+    est_savings = np.empty(n, dtype=np.float64)
+    after_tax_value = np.empty(n, dtype=np.float64)
+    d2lt = np.empty(n, dtype=np.int64)
+
+    for i in prange(n):
+        hd = today_ord - purchase_ord[i]
+        lt = hd >= 366
+        g = (price[i] - cost[i]) * qty[i]
+        rate = lt_rate if lt else st_rate
+        t = g * rate if g > 0 else 0.0
+
+        holding_days[i] = hd
+        long_term[i] = lt
+        gain[i] = g
+        est_tax[i] = t
+        est_savings[i] = (-g) * rate if g < 0 else 0.0
+        after_tax_value[i] = price[i] * qty[i] - t
+        d2lt[i] = 0 if lt else max(0, 365 - hd)
+
+    return holding_days, long_term, gain, est_tax, est_savings, after_tax_value, d2lt
+
+
+# Compiled lazily on first call; cache=True keeps the machine code across restarts
+_kernel = njit(cache=True, parallel=True)(_batch_estimate) if njit is not None else None
+
+# One launch at a time: sync endpoints run on a threadpool, and Numba's workqueue layer
+# (the fallback without TBB/OpenMP) aborts the process on concurrent parallel launches.
+# Each launch already spreads over every core, so serializing them costs little throughput.
+_kernel_lock = threading.Lock()
+
+
+def _locked_batch_estimate(qty, cost, price, purchase_ord, today_ord, lt_rate, st_rate):
+    with _kernel_lock:
+        return _kernel(qty, cost, price, purchase_ord, today_ord, lt_rate, st_rate)
+
+
+batch_estimate = _locked_batch_estimate if _kernel is not None else None
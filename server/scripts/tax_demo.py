@@ -1,14 +1,23 @@
-import json, csv, sys
+import argparse, csv, os, sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from datetime import date
-from tabulate import tabulate
+import numpy as np
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    import json
+    _loads = json.loads
 
 # Ensure 'server' is on sys.path when running this file directly
 ROOT = Path(__file__).resolve().parents[1]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
-from app.tax_engine import TaxProfile, Lot, estimate_lot, summarize
+from app import tax_engine
+from app.tax_engine import TaxProfile, LotResult, PortfolioSummary, estimate_batch, summarize
 
 # Edit these prices as you like (we'll add live quotes later)
 PRICES = {
@@ -19,56 +28,261 @@ PRICES = {
     "AMZN": 181.22,
 }
 
+# Fixed price universe: each symbol gets a small int id indexing a flat price array
+SYMS = {s: i for i, s in enumerate(PRICES)}
+PRICE_ARR = np.array([PRICES[s] for s in SYMS], dtype=np.float64)
+
+def symbol_ids(symbols):
+    """SYMS id for each symbol, -1 where it has no price; one dict probe per distinct symbol."""
+    uniq, inverse = np.unique(symbols, return_inverse=True)
+    ids = np.array([SYMS.get(s, -1) for s in uniq.tolist()], dtype=np.intp)
+    return ids[inverse.reshape(-1)]
+
 def load_profile(path=ROOT/"data/tax_profile.example.json") -> TaxProfile:
-    with open(path) as f:
-        p = json.load(f)
-    return TaxProfile(**p)
+    # Binary read: orjson parses the raw bytes (json.loads accepts them too)
+    with open(path, "rb") as f:
+        return TaxProfile(**_loads(f.read()))
+
+# Purchase dates are days since the Unix epoch in datetime64[D]; shifting by this gives ordinals
+_EPOCH_ORD = date(1970, 1, 1).toordinal()
+
+def _lot_records(symbols, quantity, cost_per_share, purchase_date, account):
+    """
+    Holdings as one structured array (fields symbol, quantity, cost_per_share,
+    purchase_date, account) so the estimator reads whole columns, not Lot objects.
+    String widths are sized to the data; a missing account is ''.
+    """
+    return np.rec.fromarrays(
+        [
+            np.asarray(symbols, dtype=str),
+            np.asarray(quantity, dtype=np.float64),
+            np.asarray(cost_per_share, dtype=np.float64),
+            np.asarray(purchase_date, dtype="datetime64[D]"),
+            np.asarray(account, dtype=str),
+        ],
+        names=["symbol", "quantity", "cost_per_share", "purchase_date", "account"],
+    )
 
 def load_lots(path=ROOT/"data/holdings.example.csv"):
-    lots = []
-    with open(path) as f:
-        for r in csv.DictReader(f):
-            lots.append(Lot(
-                symbol=r["symbol"],
-                quantity=float(r["quantity"]),
-                cost_per_share=float(r["cost_per_share"]),
-                purchase_date=date.fromisoformat(r["purchase_date"]),
-                account=r.get("account") or None
-            ))
-    return lots
-
-def main():
+    # pandas' C tokenizer and vectorized date parsing when available; stdlib otherwise
+    try:
+        import pandas as pd
+    except ImportError:
+        return _load_lots_csv(path)
+
+    try:
+        df = pd.read_csv(
+            path,
+            dtype={"symbol": "string", "quantity": "float64", "cost_per_share": "float64", "account": "string"},
+            parse_dates=["purchase_date"],
+            engine="c",
+        )
+    except pd.errors.EmptyDataError:
+        # Zero-byte file: no lots, same as the csv.reader fallback
+        return _lot_records([], [], [], [], [])
+    accounts = df["account"].fillna("").to_numpy(str) if "account" in df else [""] * len(df)
+    return _lot_records(
+        df["symbol"].to_numpy(str),
+        df["quantity"].to_numpy(),
+        df["cost_per_share"].to_numpy(),
+        df["purchase_date"].to_numpy("datetime64[D]"),
+        accounts,
+    )
+
+def _load_lots_csv(path):
+    # Positional csv.reader: no per-row dict; column positions come from the header once
+    symbols, quantity, cost, dates, accounts = [], [], [], [], []
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is not None:
+            sym_i = header.index("symbol")
+            qty_i = header.index("quantity")
+            cost_i = header.index("cost_per_share")
+            date_i = header.index("purchase_date")
+            acct_i = header.index("account") if "account" in header else len(header)
+            for row in reader:
+                if not row:
+                    continue
+                symbols.append(row[sym_i])
+                quantity.append(float(row[qty_i]))
+                cost.append(float(row[cost_i]))
+                # ISO strings go straight into datetime64[D]; numpy parses the column at once
+                dates.append(row[date_i])
+                accounts.append(row[acct_i] if acct_i < len(row) else "")
+    return _lot_records(symbols, quantity, cost, dates, accounts)
+
+def estimate_lots_batch(lots, prices, profile, today=None, use_numba=None):
+    """Vectorized estimate_lot over a lot record array, with prices given in the same order."""
+    batch = estimate_batch(
+        lots["quantity"],
+        lots["cost_per_share"],
+        np.asarray(prices, dtype=np.float64),
+        lots["purchase_date"].astype(np.int64) + _EPOCH_ORD,
+        profile,
+        today,
+        use_numba,
+    )
+    return [
+        LotResult(**d)
+        for d in batch.to_dicts(lots["symbol"].tolist(), lots["purchase_date"].tolist())
+    ]
+
+def _estimate_chunk(args):
+    return estimate_lots_batch(*args)
+
+def estimate_parallel(lots, prices, profile, workers, today=None):
+    """Split lots into one chunk per worker process; results keep the input order."""
+    if workers <= 1 or len(lots) < 2:
+        return estimate_lots_batch(lots, prices, profile, today)
+    size = -(-len(lots) // workers)
+    chunks = [(lots[i:i + size], prices[i:i + size], profile, today) for i in range(0, len(lots), size)]
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        return [r for part in ex.map(_estimate_chunk, chunks) for r in part]
+
+# Lots estimated per batch when streaming, bounding how many results are alive at once
+CHUNK_LOTS = 10_000
+
+HEADERS = ["Symbol","Qty","Cost","Price","Days","Term","Unrealized","Est. Tax","After-Tax"]
+
+# Per column: cell format and alignment ("<" text, ">" numbers, "." decimal-aligned numbers).
+# Only Qty ("{:g}") varies in digits after the point; fixed-precision columns right-align alike.
+_TABLE_FORMATS = (
+    ("{}", "<"), ("{:g}", "."), ("{:.2f}", ">"), ("{:.2f}", ">"), ("{}", ">"),
+    ("{}", "<"), ("{:,.2f}", ">"), ("{:,.2f}", ">"), ("{:,.2f}", ">"),
+)
+
+def _decimal_align(cells):
+    """Pad cells on the right so their decimal points line up (tabulate's numalign="decimal")."""
+    after = []
+    for c in cells:
+        pos = c.rfind(".")
+        if pos < 0:
+            pos = c.rfind("e")
+        # Counts the point itself, so "15" lines up with "1.5" as "15  "
+        after.append(len(c) - pos - 1 if pos >= 0 else -1)
+    most = max(after, default=-1)
+    return [c + " " * (most - a) for c, a in zip(cells, after)]
+
+def write_table(rows, out=None):
+    """
+    Write results as a GitHub pipe table, laid out like tabulate's "github" format.
+    Each column is formatted to strings once, widths come from those strings, and the
+    whole table goes out as a single bytes write (a text write when stdout has no
+    binary buffer, e.g. captured output or notebooks).
+    """
+    values = (
+        [r.symbol for r in rows], [r.quantity for r in rows], [r.cost_per_share for r in rows],
+        [r.price for r in rows], [r.holding_days for r in rows], [r.term.upper() for r in rows],
+        [r.unrealized_gain for r in rows], [r.est_tax_liability for r in rows],
+        [r.after_tax_value for r in rows],
+    )
+    cells, specs, rules = [], [], []
+    for header, col, (cell_fmt, align) in zip(HEADERS, values, _TABLE_FORMATS):
+        col = list(map(cell_fmt.format, col))
+        if align == ".":
+            col, align = _decimal_align(col), ">"
+        # Headers get two characters of slack, as tabulate gives them
+        width = max(len(header) + 2, max(map(len, col), default=0))
+        cells.append(col)
+        specs.append(f"{{:{align}{width}}}")
+        rules.append("-" * (width + 2))
+    fmt = ("| " + " | ".join(specs) + " |\n").format
+    lines = [fmt(*HEADERS), "|" + "|".join(rules) + "|\n"]
+    lines.extend(map(fmt, *cells))
+    table = "".join(lines)
+    if out is None:
+        out = getattr(sys.stdout, "buffer", None)
+        if out is None:
+            sys.stdout.write(table)
+            return
+        # Anything already printed sits in the text layer; keep it ahead of the table
+        sys.stdout.flush()
+    out.write(table.encode())
+    out.flush()
+
+def iter_results(lots, prices, profile, today=None, chunk=CHUNK_LOTS):
+    """Yield LotResults one batch at a time instead of materializing them all."""
+    # Decide on the kernel once from the whole input: each chunk alone is below NUMBA_MIN_LOTS
+    use_numba = len(lots) >= tax_engine.NUMBA_MIN_LOTS
+    for i in range(0, len(lots), chunk):
+        yield from estimate_lots_batch(lots[i:i + chunk], prices[i:i + chunk], profile, today, use_numba)
+
+def _write_csv_rows(results, writer):
+    """Write each result as a CSV row while passing it through to the next consumer."""
+    for r in results:
+        writer.writerow((
+            r.symbol, r.quantity, f"{r.cost_per_share:.2f}", f"{r.price:.2f}",
+            r.holding_days, r.term.upper(),
+            f"{r.unrealized_gain:.2f}", f"{r.est_tax_liability:.2f}", f"{r.after_tax_value:.2f}",
+        ))
+        yield r
+
+def summarize_stream(results):
+    """summarize() in a single pass, for a generator of streamed results."""
+    pre = ug = tax_gross = sav_gross = 0.0
+    for r in results:
+        pre += r.price * r.quantity
+        ug += r.unrealized_gain
+        tax_gross += r.est_tax_liability
+        sav_gross += r.est_tax_savings
+    net_tax = max(tax_gross - sav_gross, 0.0)
+    return PortfolioSummary(
+        pre_tax_value=pre,
+        total_unrealized_gain=ug,
+        gross_tax_on_gains=tax_gross,
+        gross_potential_savings_on_losses=sav_gross,
+        naive_net_tax_if_liquidated_now=net_tax,
+        after_tax_value_if_liquidated_now=pre - net_tax,
+    )
+
+def print_summary(s, file=None):
+    print("\nSummary:", file=file)
+    print(f"Pre-tax value: ${s.pre_tax_value:,.2f}", file=file)
+    print(f"Total unrealized P/L: ${s.total_unrealized_gain:,.2f}", file=file)
+    print(f"Gross tax on gains: ${s.gross_tax_on_gains:,.2f}", file=file)
+    print(f"Gross potential savings from losses: ${s.gross_potential_savings_on_losses:,.2f}", file=file)
+    print(f"Naive net tax if liquidated now: ${s.naive_net_tax_if_liquidated_now:,.2f}", file=file)
+    print(f"After-tax value if liquidated now: ${s.after_tax_value_if_liquidated_now:,.2f}", file=file)
+
+    print("\nNote: These are estimates only and not tax advice.", file=file)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Estimate taxes for the example holdings.")
+    parser.add_argument("--csv", action="store_true",
+                        help="stream per-lot results as CSV in fixed-size batches instead of building a "
+                             "table (the holdings file itself is still loaded whole)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="estimate in N processes, 0 = one per CPU (table mode; only pays off "
+                             "for very large holdings files, pickling dominates otherwise)")
+    args = parser.parse_args(argv)
+    workers = args.workers or os.cpu_count() or 1
+
     profile = load_profile()
+    # One as-of date for the whole run: every batch, chunk and worker measures holding days
+    # from the same day instead of each calling date.today()
+    today = date.today()
+
+    # Symbol column in, price column and keep-mask out; unpriced lots are dropped as whole rows
     lots = load_lots()
-    rows = []
-    for lot in lots:
-        price = PRICES.get(lot.symbol)
-        if price is None:
-            continue
-        res = estimate_lot(lot, price, profile)
-        rows.append(res)
-
-    table = [[
-        r.symbol, r.quantity, f"{r.cost_per_share:.2f}", f"{r.price:.2f}",
-        r.holding_days, r.term.upper(),
-        f"{r.unrealized_gain:,.2f}", f"{r.est_tax_liability:,.2f}", f"{r.after_tax_value:,.2f}"
-    ] for r in rows]
-
-    print(tabulate(table,
-        headers=["Symbol","Qty","Cost","Price","Days","Term","Unrealized","Est. Tax","After-Tax"],
-        tablefmt="github"
-    ))
-
-    s = summarize(rows)
-    print("\nSummary:")
-    print(f"Pre-tax value: ${s.pre_tax_value:,.2f}")
-    print(f"Total unrealized P/L: ${s.total_unrealized_gain:,.2f}")
-    print(f"Gross tax on gains: ${s.gross_tax_on_gains:,.2f}")
-    print(f"Gross potential savings from losses: ${s.gross_potential_savings_on_losses:,.2f}")
-    print(f"Naive net tax if liquidated now: ${s.naive_net_tax_if_liquidated_now:,.2f}")
-    print(f"After-tax value if liquidated now: ${s.after_tax_value_if_liquidated_now:,.2f}")
-
-    print("\nNote: These are estimates only and not tax advice.")
+    sym_ids = symbol_ids(lots["symbol"])
+    priced = sym_ids >= 0
+    lots, prices = lots[priced], PRICE_ARR[sym_ids[priced]]
+
+    if args.csv:
+        # One pass: rows go straight to stdout and into the running summary totals
+        writer = csv.writer(sys.stdout)
+        writer.writerow(HEADERS)
+        s = summarize_stream(_write_csv_rows(iter_results(lots, prices, profile, today), writer))
+        # Keep stdout pure CSV
+        print_summary(s, file=sys.stderr)
+        return
+
+    rows = estimate_parallel(lots, prices, profile, workers, today)
+
+    write_table(rows)
+
+    print_summary(summarize(rows))
 
 if __name__ == "__main__":
     main()
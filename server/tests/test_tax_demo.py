@@ -0,0 +1,67 @@
+import io, sys
+from datetime import date
+import pytest
+from app import tax_engine, tax_engine_fast
+from app.tax_engine import LotResult
+from scripts.tax_demo import load_lots, _load_lots_csv, load_profile, iter_results, write_table
+
+HEADER = "symbol,quantity,cost_per_share,purchase_date,account\n"
+
+@pytest.mark.parametrize("content", ["", HEADER])
+def test_loaders_agree_on_empty_files(tmp_path, content):
+    path = tmp_path / "holdings.csv"
+    path.write_text(content)
+    for loader in (load_lots, _load_lots_csv):
+        lots = loader(path)
+        assert len(lots) == 0
+        assert lots.dtype.names == ("symbol", "quantity", "cost_per_share", "purchase_date", "account")
+
+class _KernelCalled(Exception):
+    pass
+
+@pytest.mark.parametrize("min_lots,uses_kernel", [(10**9, False), (20, True)])
+def test_streaming_honors_numba_threshold(monkeypatch, min_lots, uses_kernel):
+    def kernel(*args):
+        raise _KernelCalled
+    monkeypatch.setattr(tax_engine_fast, "batch_estimate", kernel)
+    monkeypatch.setattr(tax_engine, "NUMBA_MIN_LOTS", min_lots)
+    lots = load_lots()
+    lots = lots.repeat(-(-25 // len(lots)))[:25]
+    prices = [100.0] * len(lots)
+    if uses_kernel:
+        with pytest.raises(_KernelCalled):
+            list(iter_results(lots, prices, load_profile(), chunk=10))
+    else:
+        assert len(list(iter_results(lots, prices, load_profile(), chunk=10))) == 25
+
+# Same layout tabulate's "github" format gave: Qty decimal-aligned, other numbers right-aligned
+GOLDEN_TABLE = """\
+| Symbol   |    Qty |   Cost |   Price |   Days | Term   |   Unrealized |   Est. Tax |   After-Tax |
+|----------|--------|--------|---------|--------|--------|--------------|------------|-------------|
+| AAPL     | 15     | 138.42 |  230.10 |    888 | LONG   |     1,375.20 |     334.17 |    3,117.33 |
+| BRK.B    |  1.5   | 450.00 |  412.00 |     30 | SHORT  |       -57.00 |       0.00 |      618.00 |
+| X        |  0.125 |   8.00 |    9.99 |    400 | LONG   |         0.25 |       0.06 |        1.19 |
+| TINY     |  1e-05 |   1.00 | 1000.00 |      5 | SHORT  |         0.01 |       0.00 |        0.01 |
+| SHRT     | -2.25  |  60.00 |   50.00 |    100 | SHORT  |        22.50 |      10.37 |     -122.87 |
+"""
+
+def _table_rows():
+    d = date(2023,1,1)
+    return [
+        LotResult("AAPL", 15.0, 230.1, 138.42, d, 888, "long", 1375.2, 334.17, 3117.33, 0.0, 0),
+        LotResult("BRK.B", 1.5, 412.0, 450.0, d, 30, "short", -57.0, 0.0, 618.0, 21.09, 335),
+        LotResult("X", 0.125, 9.99, 8.0, d, 400, "long", 0.24875, 0.06, 1.19, 0.0, 0),
+        LotResult("TINY", 1e-05, 1000.0, 1.0, d, 5, "short", 0.00999, 0.0, 0.01, 0.0, 360),
+        LotResult("SHRT", -2.25, 50.0, 60.0, d, 100, "short", 22.5, 10.37, -122.87, 0.0, 265),
+    ]
+
+def test_write_table_golden():
+    out = io.BytesIO()
+    write_table(_table_rows(), out)
+    assert out.getvalue().decode() == GOLDEN_TABLE
+
+def test_write_table_text_only_stdout(monkeypatch):
+    stdout = io.StringIO()
+    monkeypatch.setattr(sys, "stdout", stdout)
+    write_table(_table_rows())
+    assert stdout.getvalue() == GOLDEN_TABLE
@@ -1,30 +1,87 @@
+import os, subprocess, sys
 from datetime import date, timedelta
-from app.tax_engine import TaxProfile, Lot, estimate_lot, summarize, is_long_term
+from pathlib import Path
+import pytest
+from app.tax_engine import TaxProfile, Lot, estimate_lot, summarize, is_long_term, estimate_batch, summarize_batch
 
-PROFILE = TaxProfile("single",0.37,0.15,"CA",0.093,0.093,0.0,0.0)
+FIXED_TODAY = date(2025,1,2)
+D_2023_01_01 = date(2023,1,1)
 
 def test_boundary_term():
-    d_short = date.today() - timedelta(days=365)
-    d_long  = date.today() - timedelta(days=366)
-    assert is_long_term(d_short) is False
-    assert is_long_term(d_long) is True
-
-def test_gain_and_loss():
-    lot_gain = Lot("AAA", 10, 100.0, date(2023,1,1))
-    r = estimate_lot(lot_gain, price=150.0, profile=PROFILE, today=date(2025,1,2))
-    assert r.unrealized_gain == 500.0
-    assert r.est_tax_liability > 0
-    lot_loss = Lot("BBB", 10, 100.0, date(2023,1,1))
-    r2 = estimate_lot(lot_loss, price=80.0, profile=PROFILE, today=date(2025,1,2))
-    assert r2.unrealized_gain == -200.0
-    assert r2.est_tax_liability == 0
-    assert r2.est_tax_savings > 0
-
-def test_summary():
+    d_short = FIXED_TODAY - timedelta(days=365)
+    d_long  = FIXED_TODAY - timedelta(days=366)
+    assert is_long_term(d_short, FIXED_TODAY) is False
+    assert is_long_term(d_long, FIXED_TODAY) is True
+
+@pytest.fixture(scope="session")
+def profile():
+    return TaxProfile("single",0.37,0.15,"CA",0.093,0.093,0.0,0.0)
+
+@pytest.mark.parametrize("price,expected_gain,taxed", [(150.0, 500.0, True), (80.0, -200.0, False)])
+def test_gain_and_loss(profile, price, expected_gain, taxed):
+    r = estimate_lot(Lot("AAA", 10, 100.0, D_2023_01_01), price=price, profile=profile, today=FIXED_TODAY)
+    assert r.unrealized_gain == expected_gain
+    assert (r.est_tax_liability > 0) is taxed
+    assert (r.est_tax_savings > 0) is not taxed
+
+def test_summary(profile):
     from app.tax_engine import LotResult
     r = summarize([
-        estimate_lot(Lot("AAA",1,100,date(2023,1,1)),120,PROFILE,date(2025,1,2)),
-        estimate_lot(Lot("BBB",1,200,date(2023,1,1)),180,PROFILE,date(2025,1,2)),
+        estimate_lot(Lot("AAA",1,100,D_2023_01_01),120,profile,FIXED_TODAY),
+        estimate_lot(Lot("BBB",1,200,D_2023_01_01),180,profile,FIXED_TODAY),
     ])
     assert r.pre_tax_value > 0
     assert r.after_tax_value_if_liquidated_now <= r.pre_tax_value
+
+def test_batch_matches_estimate_lot(profile):
+    lots = [Lot("AAA",10,100.0,D_2023_01_01), Lot("BBB",5,200.0,date(2024,12,1)), Lot("CCC",3,50.0,date(2024,1,2))]
+    prices = [150.0, 180.0, 50.0]
+    expected = [estimate_lot(l, p, profile, FIXED_TODAY) for l, p in zip(lots, prices)]
+    batch = estimate_batch(
+        [l.quantity for l in lots], [l.cost_per_share for l in lots], prices,
+        [l.purchase_date.toordinal() for l in lots], profile, FIXED_TODAY,
+    )
+    got = batch.to_dicts([l.symbol for l in lots], [l.purchase_date for l in lots])
+    assert got == [r.__dict__ for r in expected]
+    s = summarize_batch(batch)
+    assert abs(s.naive_net_tax_if_liquidated_now - summarize(expected).naive_net_tax_if_liquidated_now) < 1e-9
+
+def test_numba_kernel_matches_numpy(profile):
+    pytest.importorskip("numba")
+    args = ([10, 5, 3, 7], [100.0, 200.0, 50.0, 10.0], [150.0, 180.0, 50.0, 9.0],
+            [D_2023_01_01.toordinal(), date(2024,12,1).toordinal(), date(2024,1,2).toordinal(), date(2024,1,1).toordinal()])
+    expected = estimate_batch(*args, profile, FIXED_TODAY, use_numba=False)
+    got = estimate_batch(*args, profile, FIXED_TODAY, use_numba=True)
+    for name in expected.__dataclass_fields__:
+        assert getattr(got, name).tolist() == getattr(expected, name).tolist(), name
+
+_CONCURRENT_KERNEL = """
+import threading
+import numpy as np
+from datetime import date
+from app.tax_engine import TaxProfile, estimate_batch
+profile = TaxProfile("single",0.37,0.15,"CA",0.093,0.093,0.0,0.0)
+n = 100_000
+args = (np.full(n, 3.0), np.full(n, 10.0), np.full(n, 12.0), np.full(n, date(2023,1,1).toordinal()))
+expected = estimate_batch(*args, profile, date(2025,1,2), use_numba=True).est_tax_liability.tolist()
+errors = []
+def run():
+    for _ in range(10):
+        if estimate_batch(*args, profile, date(2025,1,2), use_numba=True).est_tax_liability.tolist() != expected:
+            errors.append(1)
+threads = [threading.Thread(target=run) for _ in range(8)]
+for t in threads: t.start()
+for t in threads: t.join()
+assert not errors
+"""
+
+def test_numba_kernel_concurrent_threads():
+    pytest.importorskip("numba")
+    # Own process: the threading layer is fixed at first launch, and workqueue is the one
+    # that aborts on concurrent parallel launches (as from FastAPI's threadpool)
+    env = dict(os.environ, NUMBA_THREADING_LAYER="workqueue")
+    proc = subprocess.run(
+        [sys.executable, "-c", _CONCURRENT_KERNEL],
+        cwd=Path(__file__).resolve().parents[1], env=env, capture_output=True, text=True, timeout=600,
+    )
+    assert proc.returncode == 0, proc.stderr